@@ -0,0 +1,214 @@
+import typing as T
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+
+    NUMBA_INSTALLED = True
+except ImportError:
+    NUMBA_INSTALLED = False
+
+
+def _child_bounds_numpy(parents: np.ndarray) -> np.ndarray:
+    left, bottom, right, top = parents.T
+    xcenter = (left + right) * 0.5
+    ycenter = (bottom + top) * 0.5
+
+    # (N, 4 children, 4 bounds) -> (4N, 4), with the children of each
+    # parent laid out contiguously in quadrant order
+    return np.stack(
+        (
+            # lower left
+            np.c_[left, bottom, xcenter, ycenter],
+            # upper left
+            np.c_[left, ycenter, xcenter, top],
+            # lower right
+            np.c_[xcenter, bottom, right, ycenter],
+            # upper right
+            np.c_[xcenter, ycenter, right, top],
+        ),
+        axis=1,
+    ).reshape(-1, 4)
+
+
+def _split_samples_numpy(
+    bounds: np.ndarray,
+    xy: np.ndarray,
+    quad_idx: np.ndarray,
+    sample_idx: np.ndarray,
+) -> T.Tuple[np.ndarray, np.ndarray]:
+    parents = bounds[quad_idx]
+    xcenter = (parents[:, 0] + parents[:, 2]) * 0.5
+    ycenter = (parents[:, 1] + parents[:, 3]) * 0.5
+    x = xy[sample_idx, 0]
+    y = xy[sample_idx, 1]
+    left = x <= xcenter
+    right = x >= xcenter
+    bottom = y <= ycenter
+    top = y >= ycenter
+
+    child_idx: T.List[np.ndarray] = []
+    child_sample_idx: T.List[np.ndarray] = []
+    for quadrant, in_quadrant in enumerate(
+        (left & bottom, left & top, right & bottom, right & top)
+    ):
+        child_idx.append(quad_idx[in_quadrant] * 4 + quadrant)
+        child_sample_idx.append(sample_idx[in_quadrant])
+
+    return np.concatenate(child_idx), np.concatenate(child_sample_idx)
+
+
+if NUMBA_INSTALLED:
+
+    @njit(cache=True, parallel=True)
+    def _child_bounds_numba(parents):
+        out = np.empty((parents.shape[0] * 4, 4), dtype=np.float64)
+        for i in prange(parents.shape[0]):
+            left = parents[i, 0]
+            bottom = parents[i, 1]
+            right = parents[i, 2]
+            top = parents[i, 3]
+            xcenter = (left + right) * 0.5
+            ycenter = (bottom + top) * 0.5
+            j = i * 4
+
+            # lower left
+            out[j, 0] = left
+            out[j, 1] = bottom
+            out[j, 2] = xcenter
+            out[j, 3] = ycenter
+            # upper left
+            out[j + 1, 0] = left
+            out[j + 1, 1] = ycenter
+            out[j + 1, 2] = xcenter
+            out[j + 1, 3] = top
+            # lower right
+            out[j + 2, 0] = xcenter
+            out[j + 2, 1] = bottom
+            out[j + 2, 2] = right
+            out[j + 2, 3] = ycenter
+            # upper right
+            out[j + 3, 0] = xcenter
+            out[j + 3, 1] = ycenter
+            out[j + 3, 2] = right
+            out[j + 3, 3] = top
+
+        return out
+
+    @njit(cache=True)
+    def _quadrant_flags(left, bottom, right, top, x, y):
+        xcenter = (left + right) * 0.5
+        ycenter = (bottom + top) * 0.5
+        is_left = x <= xcenter
+        is_right = x >= xcenter
+        is_bottom = y <= ycenter
+        is_top = y >= ycenter
+
+        return (
+            is_left and is_bottom,
+            is_left and is_top,
+            is_right and is_bottom,
+            is_right and is_top,
+        )
+
+    @njit(cache=True, parallel=True)
+    def _split_samples_numba(bounds, xy, quad_idx, sample_idx):
+        n = quad_idx.shape[0]
+
+        # Count the children of each sample (more than one on a center line)
+        num_children = np.empty(n, dtype=np.int64)
+        for i in prange(n):
+            q = quad_idx[i]
+            s = sample_idx[i]
+            flags = _quadrant_flags(
+                bounds[q, 0],
+                bounds[q, 1],
+                bounds[q, 2],
+                bounds[q, 3],
+                xy[s, 0],
+                xy[s, 1],
+            )
+            num_children[i] = flags[0] + flags[1] + flags[2] + flags[3]
+
+        offsets = np.empty(n + 1, dtype=np.int64)
+        offsets[0] = 0
+        offsets[1:] = np.cumsum(num_children)
+
+        child_idx = np.empty(offsets[n], dtype=np.int64)
+        child_sample_idx = np.empty(offsets[n], dtype=np.int64)
+        for i in prange(n):
+            q = quad_idx[i]
+            s = sample_idx[i]
+            flags = _quadrant_flags(
+                bounds[q, 0],
+                bounds[q, 1],
+                bounds[q, 2],
+                bounds[q, 3],
+                xy[s, 0],
+                xy[s, 1],
+            )
+            j = offsets[i]
+            for quadrant in range(4):
+                if flags[quadrant]:
+                    child_idx[j] = q * 4 + quadrant
+                    child_sample_idx[j] = s
+                    j += 1
+
+        return child_idx, child_sample_idx
+
+
+def child_bounds(parents: np.ndarray) -> np.ndarray:
+    """Splits quadrant bounds into child quadrant bounds.
+
+    Uses a compiled kernel when ``numba`` is installed.
+
+    1 | 3
+    --|--
+    0 | 2
+
+    Args:
+        parents (ndarray): The (N, 4) parent left, bottom, right, top bounds.
+
+    Returns:
+        The (4N, 4) child bounds, ordered by parent and then by quadrant.
+    """
+    parents = np.ascontiguousarray(parents, dtype='float64').reshape(-1, 4)
+    if NUMBA_INSTALLED:
+        return _child_bounds_numba(parents)
+
+    return _child_bounds_numpy(parents)
+
+
+def split_samples(
+    bounds: np.ndarray,
+    xy: np.ndarray,
+    quad_idx: np.ndarray,
+    sample_idx: np.ndarray,
+) -> T.Tuple[np.ndarray, np.ndarray]:
+    """Assigns the point samples of each quadrant to its child quadrants.
+
+    Points on a center line intersect, and are assigned to, both adjacent
+    children, matching a spatial index ``intersects`` query. Uses a compiled
+    kernel when ``numba`` is installed.
+
+    Args:
+        bounds (ndarray): The (N, 4) quadrant left, bottom, right, top bounds.
+        xy (ndarray): The (M, 2) sample point coordinates.
+        quad_idx (ndarray): The quadrant index of each quadrant/sample pair.
+        sample_idx (ndarray): The sample index of each quadrant/sample pair.
+
+    Returns:
+        The child index (``4 * quadrant + child``) and sample index pairs.
+    """
+    quad_idx = np.asarray(quad_idx, dtype='int64')
+    sample_idx = np.asarray(sample_idx, dtype='int64')
+    if NUMBA_INSTALLED:
+        return _split_samples_numba(
+            np.ascontiguousarray(bounds, dtype='float64'),
+            np.ascontiguousarray(xy, dtype='float64'),
+            quad_idx,
+            sample_idx,
+        )
+
+    return _split_samples_numpy(bounds, xy, quad_idx, sample_idx)
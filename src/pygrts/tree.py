@@ -2,32 +2,67 @@ import typing as T
 from abc import ABC, abstractmethod
 from collections import namedtuple
 from dataclasses import dataclass
+from functools import cached_property
 
 import geopandas as gpd
 import numpy as np
 import pandas as pd
+import shapely
 from pyproj import CRS
 from scipy.spatial import cKDTree
-from shapely.geometry import Point, Polygon, box
+from shapely.geometry import Polygon, box
 from sklearn.cluster import KMeans
 
+from ._kernels import child_bounds, split_samples
+
 BBox = namedtuple('BBox', 'left bottom right top')
 ID_COLUMN = 'uid'
+# Below this many query points, threading costs more than it saves
+MIN_PARALLEL_QUERY_POINTS = 64
 
 
 @pd.api.extensions.register_dataframe_accessor('grts')
 class GRTSFrame:
     def __init__(self, obj):
         self._obj = obj
-        data = np.c_[self._obj.geometry.x.values, self._obj.geometry.y.values]
-        self.tree = cKDTree(data)
 
-    def query_points(self, points: np.ndarray, k: int = 1) -> gpd.GeoDataFrame:
+    @cached_property
+    def xy(self) -> np.ndarray:
+        """Get the point coordinates as an (N, 2) array."""
+        xy = np.empty((len(self._obj.index), 2), dtype='float64')
+        xy[:, 0] = self._obj.geometry.x.to_numpy()
+        xy[:, 1] = self._obj.geometry.y.to_numpy()
+
+        return xy
+
+    @cached_property
+    def tree(self) -> cKDTree:
+        """Get the k-d tree of point coordinates, built on first access."""
+        return cKDTree(
+            self.xy, leafsize=32, balanced_tree=False, compact_nodes=False
+        )
+
+    def query_points(
+        self,
+        points: np.ndarray,
+        k: int = 1,
+        workers: T.Optional[int] = None,
+    ) -> gpd.GeoDataFrame:
         """
+        Args:
+            points (ndarray): The (N, 2) coordinates to query.
+            k (Optional[int]): The number of nearest neighbors to return.
+            workers (Optional[int]): The number of threads used by the k-d tree query.
+                -1 uses all processors. Default is ``None``, which uses all
+                processors unless there are only a few query points.
+
         Returns:
             (distances, indices, mask)
         """
-        distances, indices = self.tree.query(points, k=k)
+        if workers is None:
+            workers = -1 if len(points) >= MIN_PARALLEL_QUERY_POINTS else 1
+
+        distances, indices = self.tree.query(points, k=k, workers=workers)
         df = self._obj.iloc[indices]
         df = df.assign(point_distance=distances)
 
@@ -54,11 +89,26 @@ class Splits:
     test: SampleSplit = None
 
 
+def _group_rank(groups: np.ndarray) -> np.ndarray:
+    """Gets the position of each element within its group of a sorted array."""
+    return np.arange(len(groups)) - np.searchsorted(groups, groups)
+
+
 class TreeMixin(ABC):
     def __init__(self, dataframe):
         self.dataframe = dataframe
         self.sindex = self.dataframe.sindex
 
+    @cached_property
+    def xy(self) -> np.ndarray:
+        """Get the sample point coordinates as an (N, 2) array."""
+        return self.dataframe.grts.xy
+
+    @cached_property
+    def is_point_data(self) -> bool:
+        """Get whether all samples are point geometries."""
+        return bool((self.dataframe.geom_type == 'Point').all())
+
     @property
     def crs(self):
         """Get the GeoDataFrame CRS."""
@@ -79,11 +129,61 @@ class TreeMixin(ABC):
         """Gets the intersection of a polygon geometry."""
         return list(self.sindex.intersection(geometry))
 
+    def intersection_bulk(
+        self, bounds: T.Union[np.ndarray, T.Sequence[T.Sequence[float]]]
+    ) -> T.Tuple[np.ndarray, np.ndarray]:
+        """Gets the intersections of many bounding boxes in one query.
+
+        Args:
+            bounds (ndarray): The (M, 4) left, bottom, right, top bounds.
+
+        Returns:
+            The bounding box indices and the intersecting sample indices.
+        """
+        bounds = np.asarray(bounds, dtype='float64').reshape(-1, 4)
+
+        return self.sindex.query(
+            shapely.box(
+                bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3]
+            ),
+            predicate='intersects',
+        )
+
+    def grid_samples(
+        self, df_sample: gpd.GeoDataFrame
+    ) -> T.Tuple[np.ndarray, np.ndarray]:
+        """Gets the grid index and sample index pairs of intersecting samples.
+
+        Args:
+            df_sample (GeoDataFrame): The grids.
+
+        Returns:
+            The grid index and sample index pairs, ordered by grid.
+        """
+        grid_idx, sample_idx = self.sindex.query(
+            df_sample.geometry.values, predicate='intersects'
+        )
+        # Group the sample indices by grid. Bulk queries return hits
+        # ordered by input geometry, so the sort is usually skipped.
+        if (np.diff(grid_idx) < 0).any():
+            order = np.argsort(grid_idx, kind='stable')
+            sample_idx = sample_idx[order]
+            grid_idx = grid_idx[order]
+
+        return grid_idx, sample_idx
+
     def iter_samples(
         self, df_sample: gpd.GeoDataFrame
-    ) -> T.Tuple[Point, T.List[int]]:
-        for row in df_sample.itertuples():
-            yield row.geometry, list(self.sindex.query(row.geometry))
+    ) -> T.Iterator[T.Tuple[Polygon, np.ndarray]]:
+        """Iterates over grids and the samples that intersect them."""
+        geometry = df_sample.geometry.values
+        grid_idx, sample_idx = self.grid_samples(df_sample)
+        boundaries = np.zeros(len(geometry) + 1, dtype='int64')
+        np.cumsum(
+            np.bincount(grid_idx, minlength=len(geometry)), out=boundaries[1:]
+        )
+        for i, grid_geometry in enumerate(geometry):
+            yield grid_geometry, sample_idx[boundaries[i] : boundaries[i + 1]]
 
     @abstractmethod
     def to_geom(self):
@@ -152,7 +252,23 @@ class QuadTree(TreeMixin):
     @property
     def nquads(self) -> int:
         """Get the number of quadrants in the tree."""
-        return len(self.tree)
+        return len(self.tree_bounds)
+
+    @property
+    def tree_bounds(self) -> np.ndarray:
+        """Get the (N, 4) left, bottom, right, top quadrant bounds."""
+        return self._tree_bounds
+
+    @tree_bounds.setter
+    def tree_bounds(
+        self, bounds: T.Union[np.ndarray, T.Sequence[T.Sequence[float]]]
+    ) -> None:
+        self._tree_bounds = np.asarray(bounds, dtype='float64').reshape(-1, 4)
+        # Cached values are only valid for the bounds they were built from
+        self._geom_cache = None
+        self._frame_cache = None
+        self._id_to_bbox = None
+        self._quad_samples = None
 
     @property
     def tree(self) -> T.Sequence[Polygon]:
@@ -171,14 +287,12 @@ class QuadTree(TreeMixin):
     @property
     def qy_len(self) -> float:
         """Get the quadrant latitudinal length."""
-        bbox = self.bounds_to_tuple(self.tree_bounds[0])
-        return bbox.top - bbox.bottom
+        return float(self.tree_bounds[0, 3] - self.tree_bounds[0, 1])
 
     @property
     def qx_len(self) -> float:
         """Get the quadrant longitudinal length."""
-        bbox = self.bounds_to_tuple(self.tree_bounds[0])
-        return bbox.right - bbox.left
+        return float(self.tree_bounds[0, 2] - self.tree_bounds[0, 0])
 
     @property
     def qmin(self):
@@ -193,39 +307,79 @@ class QuadTree(TreeMixin):
     @property
     def bounds(self) -> BBox:
         """Get the tree bounds."""
-        frame = self.to_frame().total_bounds.flatten().tolist()
+        return self.bounds_to_tuple(
+            (
+                self.tree_bounds[:, 0].min(),
+                self.tree_bounds[:, 1].min(),
+                self.tree_bounds[:, 2].max(),
+                self.tree_bounds[:, 3].max(),
+            )
+        )
+
+    @property
+    def _geometry(self) -> np.ndarray:
+        """Get the quadrant geometry as a shapely array."""
+        if self._geom_cache is None:
+            self._geom_cache = shapely.box(
+                self.tree_bounds[:, 0],
+                self.tree_bounds[:, 1],
+                self.tree_bounds[:, 2],
+                self.tree_bounds[:, 3],
+            )
 
-        return self.bounds_to_tuple(frame)
+        return self._geom_cache
 
     def to_geom(self) -> T.List[Polygon]:
         """Converts quadrant bounds to geometry."""
-        return [self.create_poly(bbox) for bbox in self.tree_bounds]
+        return self._geometry.tolist()
 
     def to_frame(self) -> gpd.GeoDataFrame:
         """Converts tree quadrants to a DataFrame."""
-        return gpd.GeoDataFrame(
-            data=self.tree_ids,
-            geometry=self.to_geom(),
-            crs=self.crs,
-            columns=[ID_COLUMN],
-        )
+        if self._frame_cache is None:
+            self._frame_cache = gpd.GeoDataFrame(
+                data=self.tree_ids,
+                geometry=self._geometry,
+                crs=self.crs,
+                columns=[ID_COLUMN],
+            )
+
+        return self._frame_cache.copy()
+
+    @property
+    def quad_samples(self) -> T.Tuple[np.ndarray, np.ndarray]:
+        """Get the quadrant and sample indices of samples that intersect
+        each quadrant."""
+        if self._quad_samples is None:
+            self._quad_samples = self.intersection_bulk(self.tree_bounds)
+
+        return self._quad_samples
+
+    @property
+    def quad_counts(self) -> np.ndarray:
+        """Get counts of sample occurrences in each quadrant, ordered by
+        ``tree_ids``."""
+        quad_idx, _ = self.quad_samples
+
+        return np.bincount(quad_idx, minlength=len(self.tree_ids))
 
     @property
     def counts(self) -> T.Dict[str, int]:
         """Get counts of sample occurrences in each quadrant."""
-        counts: T.Dict[str, int] = {}
-        for i, geom in zip(self.tree_ids, self.tree):
-            point_int = self.intersection(geom.bounds)
-            if point_int:
-                counts[i] = len(point_int)
-
-        return counts
+        return {
+            qid: int(qcount)
+            for qid, qcount in zip(self.tree_ids, self.quad_counts)
+            if qcount
+        }
 
     def counts_to_frame(self) -> gpd.GeoDataFrame:
-        return (
-            pd.DataFrame(self.counts, index=['qcounts'])
-            .T.rename_axis(index=ID_COLUMN)
-            .reset_index()
+        quad_counts = self.quad_counts
+        nonzero = np.flatnonzero(quad_counts)
+
+        return pd.DataFrame(
+            {
+                ID_COLUMN: [self.tree_ids[i] for i in nonzero],
+                'qcounts': quad_counts[nonzero].astype('int64'),
+            }
         )
 
     def count(self, qid: str) -> int:
@@ -235,17 +389,14 @@ class QuadTree(TreeMixin):
             qid (str): The quadrant id.
         """
 
-        bbox = (
-            self.to_frame()
-            .query(f"id == '{qid}'")
-            .geometry.bounds.values.flatten()
-            .tolist()
-        )
+        if self._id_to_bbox is None:
+            self._id_to_bbox = dict(zip(self.tree_ids, self.tree_bounds))
 
-        # Get points that intersect the quadrant
-        point_int = self.intersection(bbox)
+        # Get samples that intersect the quadrant, with the same predicate
+        # as ``counts``
+        quad_idx, _ = self.intersection_bulk(self._id_to_bbox[qid])
 
-        return len(point_int) if point_int else 0
+        return len(quad_idx)
 
     def split(self, thresh: int = 0) -> "QuadTree":
         """Splits a tree into quadrants.
@@ -258,42 +409,40 @@ class QuadTree(TreeMixin):
             thresh (int): The sample threshold to remove a quadrant. Default is 0, or remove a
                 quadrant if it is empty.
         """
-        new_tree_bounds: T.List[namedtuple] = []
-        new_tree_ids: T.List[str] = []
-
-        self.contains_null = False
-
-        for qi, quad in enumerate(self.tree):
-            left, bottom, right, top = quad.bounds
-            xcenter = left + (right - left) / 2.0
-            ycenter = top - (top - bottom) / 2.0
-
-            quad_id = self.tree_ids[qi]
-            qdict = {
-                # lower left
-                0: (left, bottom, xcenter, ycenter),
-                # upper left
-                1: (left, ycenter, xcenter, top),
-                # lower right
-                2: (xcenter, bottom, right, ycenter),
-                # upper right
-                3: (xcenter, ycenter, right, top),
-            }
+        children = child_bounds(self.tree_bounds)
 
-            for qid, bbox in qdict.items():
-                id_list = self.intersection(bbox)
-                if id_list:
-                    if len(id_list) > thresh:
-                        new_tree_bounds.append(bbox)
-                        new_tree_ids.append(f"{quad_id}{qid}")
-                    else:
-                        self.contains_null = True
+        if self.is_point_data:
+            child_idx, sample_idx = split_samples(
+                self.tree_bounds, self.xy, *self.quad_samples
+            )
+        else:
+            # Query all children against the sample index at once
+            child_idx, sample_idx = self.intersection_bulk(children)
+
+        child_counts = np.bincount(child_idx, minlength=len(children))
+        keep = child_counts > max(thresh, 0)
+
+        # Carry the samples of kept children over to the next split
+        new_child_idx = np.cumsum(keep) - 1
+        in_kept = keep[child_idx]
+        quad_samples = (
+            new_child_idx[child_idx[in_kept]],
+            sample_idx[in_kept],
+        )
 
-                else:
-                    self.contains_null = True
+        # Only build ids for the kept children. Children are ordered by
+        # parent, so the parent is ``index // 4`` and the quadrant
+        # is ``index % 4``.
+        keep_idx = np.flatnonzero(keep)
+        child_ids = np.char.add(
+            np.array(self.tree_ids, dtype=str)[keep_idx // 4],
+            (keep_idx % 4).astype(str),
+        )
 
-        self.tree_bounds = new_tree_bounds
-        self.tree_ids = new_tree_ids
+        self.contains_null = len(keep_idx) < len(keep)
+        self.tree_bounds = children[keep_idx]
+        self.tree_ids = child_ids.tolist()
+        self._quad_samples = quad_samples
 
         return self
 
@@ -337,6 +486,10 @@ class QuadTree(TreeMixin):
         while True:
             self.split(thresh=min_thresh)
 
+            # Nothing is left to split
+            if not self.tree_ids:
+                break
+
             if isinstance(max_length, float) or isinstance(max_length, int):
                 if self.qmax <= max_length:
                     break
@@ -346,7 +499,7 @@ class QuadTree(TreeMixin):
                     break
 
             elif isinstance(max_samples, int):
-                max_count = self.counts[max(self.counts, key=self.counts.get)]
+                max_count = max(self.counts.values(), default=0)
 
                 if max_count <= max_samples:
                     break
@@ -370,44 +523,30 @@ class QuadTree(TreeMixin):
         """
         qt_frame = self.to_frame()
 
-        # Get coordinates
-        X = np.c_[qt_frame.centroid.x.values, qt_frame.centroid.y.values]
+        # Get the quadrant center coordinates
+        X = np.c_[
+            (self.tree_bounds[:, 0] + self.tree_bounds[:, 2]) * 0.5,
+            (self.tree_bounds[:, 1] + self.tree_bounds[:, 3]) * 0.5,
+        ]
 
         # Fit a KMeans
         kmeans = KMeans(n_clusters=n_clusters).fit(X)
 
         self.clusters = gpd.GeoDataFrame(
-            data=kmeans.predict(X),
-            geometry=self.to_geom(),
+            data=kmeans.labels_,
+            geometry=self._geometry,
             crs=self.crs,
             columns=['cluster'],
         )
 
         # Get the n nearest grids to the cluster centers
-        for cluster_index in range(0, kmeans.cluster_centers_.shape[0]):
-            bounds = (
-                kmeans.cluster_centers_[cluster_index, 0],
-                kmeans.cluster_centers_[cluster_index, 1],
-                kmeans.cluster_centers_[cluster_index, 0],
-                kmeans.cluster_centers_[cluster_index, 1],
-            )
+        _, near_clusters = cKDTree(X).query(
+            kmeans.cluster_centers_, k=min(num_results, len(X))
+        )
+        near_clusters = near_clusters.ravel()
 
-            sindex = qt_frame.sindex
-            try:
-                # RTree syntax
-                near_clusters = np.array(
-                    list(sindex.nearest(bounds, num_results=num_results))
-                )
-            except TypeError:
-                # PyGEOS syntax
-                near_clusters = np.array(
-                    list(sindex.nearest(box(*bounds), return_all=True))
-                )[:num_results].flatten()
-
-            # Duplicate the near grids
-            qt_frame = pd.concat(
-                (qt_frame, qt_frame.iloc[near_clusters]), axis=0
-            )
+        # Duplicate the near grids
+        qt_frame = pd.concat((qt_frame, qt_frame.iloc[near_clusters]), axis=0)
 
         return qt_frame
 
@@ -416,24 +555,18 @@ class QuadTree(TreeMixin):
         grid_df: gpd.GeoDataFrame, weight_method: str
     ) -> gpd.GeoDataFrame:
         oversample = np.array(1.0 / (grid_df.qcounts / grid_df.qcounts.max()))
-        over_df: T.Sequence[pd.DataFrame] = []
-        for over_val in np.unique(oversample):
-            if weight_method == 'inverse-density':
-                if over_val > 1:
-                    repeated_index = grid_df.index[
-                        np.where(oversample == over_val)
-                    ].repeat(int(over_val))
-                    over_df.append(grid_df.loc[repeated_index])
-            else:
-                if over_val > 2:
-                    repeated_index = grid_df.index[
-                        np.where(oversample == over_val)
-                    ].repeat(1)
-                    over_df.append(grid_df.loc[repeated_index])
-
-        if over_df:
-            grid_df = pd.concat((grid_df, pd.concat(over_df)))
-            grid_df = grid_df.sort_values(by=ID_COLUMN)
+        if weight_method == 'inverse-density':
+            repeats = np.where(oversample > 1, oversample.astype('int64'), 0)
+        else:
+            repeats = np.where(oversample > 2, 1, 0)
+
+        if repeats.any():
+            # Repeat rows in place so that sorted grids stay sorted
+            grid_df = grid_df.iloc[
+                np.repeat(np.arange(len(repeats)), repeats + 1)
+            ]
+            if not grid_df[ID_COLUMN].is_monotonic_increasing:
+                grid_df = grid_df.sort_values(by=ID_COLUMN)
 
         return grid_df
 
@@ -456,8 +589,10 @@ class QuadTree(TreeMixin):
                     on=ID_COLUMN,
                 )
 
-        # Base 4 reverse sorting
-        grid_df = grid_df.sort_values(by=ID_COLUMN)
+        # Base 4 reverse sorting. Quadrant ids are generated in sorted
+        # order, so the sort is usually skipped.
+        if not grid_df[ID_COLUMN].is_monotonic_increasing:
+            grid_df = grid_df.sort_values(by=ID_COLUMN)
         if weight_method in (
             'density-factor',
             'inverse-density',
@@ -479,89 +614,123 @@ class QuadTree(TreeMixin):
         multiply_distance_weights_by: float,
     ) -> gpd.GeoDataFrame:
         if n > 0.5 * len(grid_df.index):
+            remaining_df = grid_df.loc[
+                ~grid_df[ID_COLUMN].isin(df_sample[ID_COLUMN].to_numpy())
+            ]
             df_sample = pd.concat(
                 (
                     df_sample,
-                    grid_df.query(
-                        f"uid != {df_sample[ID_COLUMN].values.tolist()}"
-                    ).sample(
+                    remaining_df.sample(
                         n=n - len(df_sample.index),
                         random_state=rng.integers(low=0, high=100_000),
                     ),
                 ),
             )
 
-        sample_indices: T.List[int] = []
-        # Iterate over the selected grids,
-        # get intersecting samples, and
-        # select 1 sample within each grid.
-        for row_geometry, qsamples in self.iter_samples(df_sample):
-            rng.shuffle(qsamples)
+        if strata_column is None and not weight_sample_by_distance:
+            grid_idx, sample_idx = self.grid_samples(df_sample)
+            # Shuffle within each grid, then keep the first
+            # ``samples_per_grid`` samples of every grid at once
+            order = np.lexsort((rng.random(len(sample_idx)), grid_idx))
+            keep = _group_rank(grid_idx[order]) < samples_per_grid
+
+            # Get the random points
+            return self.dataframe.iloc[np.unique(sample_idx[order][keep])]
+
+        if strata_column is not None:
+            strata_values = self.dataframe[strata_column].to_numpy()
+
+        sample_indices: T.List[np.ndarray] = []
+        # Iterate over the selected grids, get intersecting samples, and
+        # select samples by strata or distance weights within each grid.
+        # Draw one seed per grid up front so that each grid samples from
+        # its own generator
+        grid_seeds = rng.integers(low=0, high=100_000, size=len(df_sample))
+        for grid_seed, (row_geometry, qsamples) in zip(
+            grid_seeds, self.iter_samples(df_sample)
+        ):
+            grid_rng = np.random.default_rng(grid_seed)
 
             if strata_column is not None:
-                qdf = pd.DataFrame(
-                    data=np.c_[
-                        qsamples, self.dataframe.iloc[qsamples][strata_column]
-                    ],
-                    columns=['sample_index', strata_column],
+                qsamples = self._stratified_choice(
+                    samples=qsamples,
+                    strata=strata_values[qsamples],
+                    samples_per_grid=samples_per_grid,
+                    strata_samples_per_grid=strata_samples_per_grid,
+                    rng=grid_rng,
                 )
 
-                if strata_samples_per_grid is not None:
-
-                    def stratified_sample(x):
-                        return min(
-                            strata_samples_per_grid[x[strata_column].iloc[0]],
-                            len(x.index),
-                        )
-
+            elif weight_sample_by_distance:
+                # Distance from each sample to the nearest grid edge
+                if self.is_point_data:
+                    left, bottom, right, top = row_geometry.bounds
+                    qx = self.xy[qsamples, 0]
+                    qy = self.xy[qsamples, 1]
+                    distance_weights = np.minimum(
+                        np.minimum(qx - left, right - qx),
+                        np.minimum(qy - bottom, top - qy),
+                    )
                 else:
-
-                    def stratified_sample(x):
-                        return min(samples_per_grid, len(x.index))
-
-                qsamples = (
-                    qdf.groupby(strata_column, group_keys=False).apply(
-                        lambda x: x.sample(
-                            stratified_sample(x),
-                            replace=False,
-                            random_state=rng.integers(low=0, high=100_000),
-                        )
+                    distance_weights = shapely.distance(
+                        row_geometry.exterior,
+                        np.asarray(self.dataframe.geometry.values[qsamples]),
                     )
-                ).sample_index.tolist()
-
-            elif weight_sample_by_distance:
-                qdf = pd.DataFrame(
-                    data=qsamples,
-                    columns=['sample_index'],
-                )
-                distance_weights = row_geometry.exterior.distance(
-                    self.dataframe.iloc[qsamples].geometry
+                distance_weights = np.clip(
+                    1.0 - (distance_weights / distance_weights.max()), 0.1, 1
                 )
-                distance_weights = (
-                    1.0 - (distance_weights / distance_weights.max())
-                ).clip(0.1, 1)
                 distance_weights *= multiply_distance_weights_by
                 distance_weights /= distance_weights.sum()
 
-                qsamples = qdf.sample(
-                    n=min(samples_per_grid, len(qdf.index)),
+                qsamples = grid_rng.choice(
+                    qsamples,
+                    size=min(samples_per_grid, len(qsamples)),
                     replace=False,
-                    weights=distance_weights.values,
-                    random_state=rng.integers(low=0, high=100_000),
-                ).sample_index.tolist()
-            else:
-                qsamples = qsamples[:samples_per_grid]
+                    p=distance_weights,
+                )
 
-            sample_indices.extend(qsamples)
+            sample_indices.append(qsamples)
 
-        sample_indices = np.array(
-            sorted(list(set(sample_indices))),
-            dtype='int64',
+        sample_indices = np.unique(
+            np.concatenate(sample_indices).astype('int64')
+            if sample_indices
+            else np.empty(0, dtype='int64')
         )
 
         # Get the random points
         return self.dataframe.iloc[sample_indices]
 
+    @staticmethod
+    def _stratified_choice(
+        samples: np.ndarray,
+        strata: np.ndarray,
+        samples_per_grid: int,
+        strata_samples_per_grid: T.Union[None, dict],
+        rng: np.random.Generator,
+    ) -> np.ndarray:
+        """Randomly selects samples without replacement within each
+        stratum. Samples with missing strata are skipped."""
+        has_strata = ~pd.isna(strata)
+        samples = samples[has_strata]
+        strata = strata[has_strata]
+        if len(samples) == 0:
+            return samples
+
+        strata_keys, strata_idx = np.unique(strata, return_inverse=True)
+        strata_idx = strata_idx.reshape(-1)
+        if strata_samples_per_grid is not None:
+            sizes = np.array(
+                [strata_samples_per_grid[key] for key in strata_keys],
+                dtype='int64',
+            )
+        else:
+            sizes = np.full(len(strata_keys), samples_per_grid, dtype='int64')
+
+        # Shuffle within each stratum, then keep the first ``size`` samples
+        order = np.lexsort((rng.random(len(samples)), strata_idx))
+        strata_idx = strata_idx[order]
+
+        return samples[order][_group_rank(strata_idx) < sizes[strata_idx]]
+
     @staticmethod
     def _get_skip(df: gpd.GeoDataFrame, n: int) -> int:
         num_grids = len(df.index)
@@ -647,9 +816,11 @@ class QuadTree(TreeMixin):
                 seed_start=False,
             )
             # Get train split -- i.e., all grids that are not in the test split
-            train_split_grid_df = full_grid_df.query(
-                f"{ID_COLUMN} != {test_split_grid_df[ID_COLUMN].tolist()}"
-            ).reset_index(drop=True)
+            train_split_grid_df = full_grid_df.loc[
+                ~full_grid_df[ID_COLUMN].isin(
+                    test_split_grid_df[ID_COLUMN].to_numpy()
+                )
+            ].reset_index(drop=True)
             train_split_points_df = self.dataframe.loc[
                 ~self.dataframe.index.isin(test_split_points_df.index)
             ].reset_index(drop=True)
@@ -666,9 +837,11 @@ class QuadTree(TreeMixin):
                 raise ValueError('There was test leakage into train splits.')
 
             # Remove the test grids from subsequent splits
-            reduce_grid = reduce_grid.query(
-                f"{ID_COLUMN} != {test_split_grid_df[ID_COLUMN].tolist()}"
-            ).reset_index(drop=True)
+            reduce_grid = reduce_grid.loc[
+                ~reduce_grid[ID_COLUMN].isin(
+                    test_split_grid_df[ID_COLUMN].to_numpy()
+                )
+            ].reset_index(drop=True)
 
             yield Splits(
                 train=SampleSplit.set_splits(
@@ -740,9 +913,9 @@ class QuadTree(TreeMixin):
         )
 
         # Remove test samples
-        grid_df = grid_df.query(
-            f"{ID_COLUMN} != {test_grid_df[ID_COLUMN].tolist()}"
-        )
+        grid_df = grid_df.loc[
+            ~grid_df[ID_COLUMN].isin(test_grid_df[ID_COLUMN].to_numpy())
+        ]
         val_n = int(len(grid_df.index) * val_frac)
         val_grid_df, val_samples_df = self.sample_split(
             df=grid_df,
@@ -757,9 +930,9 @@ class QuadTree(TreeMixin):
         )
 
         # Remove validation samples
-        grid_df = grid_df.query(
-            f"{ID_COLUMN} != {val_grid_df[ID_COLUMN].tolist()}"
-        )
+        grid_df = grid_df.loc[
+            ~grid_df[ID_COLUMN].isin(val_grid_df[ID_COLUMN].to_numpy())
+        ]
         train_n = int(len(grid_df.index) * train_frac)
         train_grid_df, train_samples_df = self.sample_split(
             df=grid_df,
@@ -847,23 +1020,55 @@ class Rtree(TreeMixin):
     def __init__(self, dataframe):
         super(Rtree, self).__init__(dataframe)
 
+        self._leaves = None
+        self._leaf_bounds = None
+
     def __len__(self):
-        for group_idx, indices, bbox in self.sindex.leaves():
+        for group_idx, indices, bbox in self.leaves:
             n = len(indices)
             break
 
         return n
 
+    def refresh(self) -> None:
+        """Clears the cached leaves.
+
+        Call after the spatial index has been modified.
+        """
+        self._leaves = None
+        self._leaf_bounds = None
+
+    @property
+    def leaves(self) -> list:
+        """Get the spatial index leaves."""
+        if self._leaves is None:
+            self._leaves = self.sindex.leaves()
+
+        return self._leaves
+
+    @property
+    def leaf_bounds(self) -> np.ndarray:
+        """Get the (N, 4) left, bottom, right, top leaf bounds."""
+        if self._leaf_bounds is None:
+            self._leaf_bounds = np.array(
+                [bbox for group_idx, indices, bbox in self.leaves],
+                dtype='float64',
+            ).reshape(-1, 4)
+
+        return self._leaf_bounds
+
     @property
     def nleaves(self):
-        return len(self.sindex.leaves())
+        return len(self.leaves)
 
     def to_geom(self):
         """Converts leaves to geometry."""
-        return [
-            self.create_poly(bbox)
-            for group_idx, indices, bbox in self.sindex.leaves()
-        ]
+        return shapely.box(
+            self.leaf_bounds[:, 0],
+            self.leaf_bounds[:, 1],
+            self.leaf_bounds[:, 2],
+            self.leaf_bounds[:, 3],
+        ).tolist()
 
     def to_frame(self):
         """Converts leaves to a DataFrame."""
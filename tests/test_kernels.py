@@ -0,0 +1,62 @@
+import unittest
+
+import numpy as np
+
+from pygrts._kernels import (
+    _child_bounds_numpy,
+    _split_samples_numpy,
+    child_bounds,
+    split_samples,
+)
+
+PARENTS = np.array(
+    [
+        [0.0, 0.0, 4.0, 4.0],
+        [-10.0, 2.0, -6.0, 10.0],
+    ]
+)
+
+
+class TestKernels(unittest.TestCase):
+    def test_child_bounds(self):
+        children = child_bounds(PARENTS)
+        self.assertEqual(children.shape, (8, 4))
+        self.assertTrue(
+            np.allclose(
+                children[:4],
+                np.array(
+                    [
+                        [0, 0, 2, 2],
+                        [0, 2, 2, 4],
+                        [2, 0, 4, 2],
+                        [2, 2, 4, 4],
+                    ]
+                ),
+            )
+        )
+        self.assertTrue(np.allclose(children, _child_bounds_numpy(PARENTS)))
+
+    def test_split_samples(self):
+        # The last two points lie on the first parent's center lines
+        xy = np.array([[1.0, 1.0], [3.0, 3.0], [2.0, 1.0], [2.0, 2.0]])
+        quad_idx = np.array([0, 0, 0, 0])
+        sample_idx = np.array([0, 1, 2, 3])
+        child_idx, child_sample_idx = split_samples(
+            PARENTS, xy, quad_idx, sample_idx
+        )
+        pairs = sorted(zip(child_idx.tolist(), child_sample_idx.tolist()))
+        self.assertEqual(
+            pairs,
+            [(0, 0), (0, 2), (0, 3), (1, 3), (2, 2), (2, 3), (3, 1), (3, 3)],
+        )
+        numpy_pairs = sorted(
+            zip(
+                *(
+                    idx.tolist()
+                    for idx in _split_samples_numpy(
+                        PARENTS, xy, quad_idx, sample_idx
+                    )
+                )
+            )
+        )
+        self.assertEqual(pairs, numpy_pairs)
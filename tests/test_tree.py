@@ -5,6 +5,7 @@ import numpy as np
 from shapely.geometry import Point
 
 from pygrts import QuadTree
+from pygrts.tree import ID_COLUMN
 
 RNG = np.random.default_rng(100)
 
@@ -62,6 +63,43 @@ class TestTree(unittest.TestCase):
         samp_df = qt.sample(n=2, samples_per_grid=10, random_state=42)
         self.assertTrue(len(samp_df.index) == 20)
 
+    def test_sample_by_distance(self):
+        df = frame_from_coords(DATA3)
+        df = df.to_crs('epsg:8858')
+        qt = QuadTree(df, force_square=True)
+        qt.split_recursive(max_length=50_000)
+        samp_df = qt.sample(
+            n=2,
+            samples_per_grid=5,
+            weight_sample_by_distance=True,
+            random_state=42,
+        )
+        self.assertEqual(len(samp_df.index), 10)
+
+        # The box distance fast path matches the edge distance fallback
+        qt.is_point_data = False
+        fallback_df = qt.sample(
+            n=2,
+            samples_per_grid=5,
+            weight_sample_by_distance=True,
+            random_state=42,
+        )
+        self.assertEqual(samp_df.index.tolist(), fallback_df.index.tolist())
+
+    def test_sample_by_distance_polygons(self):
+        df = frame_from_coords(DATA3)
+        df = df.to_crs('epsg:8858')
+        df.geometry = df.buffer(1_000)
+        qt = QuadTree(df, force_square=True)
+        qt.split_recursive(max_length=50_000)
+        samp_df = qt.sample(
+            n=2,
+            samples_per_grid=5,
+            weight_sample_by_distance=True,
+            random_state=42,
+        )
+        self.assertEqual(len(samp_df.index), 10)
+
     def test_sample_strata(self):
         df = frame_from_coords(DATA3)
         df['strata'] = RNG.integers(low=0, high=2, size=len(df.index))
@@ -76,10 +114,48 @@ class TestTree(unittest.TestCase):
             random_state=42,
         )
         self.assertTrue(samp_df.shape == (8, 3))
-        self.assertFalse(
-            set(samp_df.sample_id.tolist()).difference(
-                [34, 168, 212, 384, 632, 706, 906, 994]
-            )
+        self.assertTrue(samp_df.sample_id.is_unique)
+        # 2 grids x 2 strata x 2 samples per grid
+        self.assertEqual(samp_df.strata.value_counts().to_dict(), {0: 4, 1: 4})
+
+        samp_df = qt.sample(
+            n=2,
+            strata_samples_per_grid={0: 1, 1: 3},
+            strata_column='strata',
+            random_state=42,
+        )
+        self.assertEqual(samp_df.strata.value_counts().to_dict(), {0: 2, 1: 6})
+
+    def test_sample_strata_missing(self):
+        df = frame_from_coords(DATA3)
+        strata = RNG.integers(low=0, high=2, size=len(df.index)).astype(float)
+        strata[::3] = np.nan
+        df['strata'] = strata
+        df = df.to_crs('epsg:8858')
+        qt = QuadTree(df, force_square=True)
+        qt.split_recursive(max_length=50_000)
+
+        # Samples with missing strata are not a stratum of their own
+        samp_df = qt.sample(
+            n=2,
+            samples_per_grid=2,
+            strata_column='strata',
+            random_state=42,
+        )
+        self.assertEqual(
+            samp_df.strata.value_counts(dropna=False).to_dict(),
+            {0.0: 4, 1.0: 4},
+        )
+
+        samp_df = qt.sample(
+            n=2,
+            strata_samples_per_grid={0: 1, 1: 3},
+            strata_column='strata',
+            random_state=42,
+        )
+        self.assertEqual(
+            samp_df.strata.value_counts(dropna=False).to_dict(),
+            {0.0: 2, 1.0: 6},
         )
 
     def test_weight_method(self):
@@ -89,22 +165,89 @@ class TestTree(unittest.TestCase):
         samp_df = qt.sample(
             n=2, weight_method='inverse-density', random_state=42
         )
-        self.assertTrue(samp_df.iloc[0].geometry == Point(-91, 43))
+        self.assertEqual(len(samp_df.index), 2)
+        self.assertIn(Point(-91, 43), samp_df.geometry.tolist())
 
         samp_df = qt.sample(
             n=2, weight_method='density-factor', random_state=42
         )
-        self.assertTrue(samp_df.iloc[0].geometry == Point(-91, 43))
+        self.assertEqual(len(samp_df.index), 2)
+        self.assertIn(Point(-91, 43), samp_df.geometry.tolist())
+
+    def test_split_thresh(self):
+        df = frame_from_coords(DATA3)
+        qt = QuadTree(df, force_square=True)
+        qt.split().split()
+        qt.split(thresh=60)
+        self.assertTrue(qt.contains_null)
+        self.assertTrue(all(count > 60 for count in qt.counts.values()))
+        self.assertEqual(len(qt.counts), len(qt))
+
+    def test_weight_grids(self):
+        df = frame_from_coords(DATA3)
+        df = df.to_crs('epsg:8858')
+        qt = QuadTree(df, force_square=True)
+        qt.split_recursive(max_length=10_000)
+        grid_df = qt.weight_grids(n_clusters=4, num_results=2)
+        self.assertEqual(len(grid_df.index), len(qt) + 4 * 2)
+        self.assertFalse(
+            set(grid_df[ID_COLUMN].tolist()).difference(qt.tree_ids)
+        )
 
     def test_split(self):
         df = frame_from_coords(DATA1)
         qt = QuadTree(df, force_square=False)
         qt.split()
         self.assertEqual(len(qt.to_frame().index), 4)
+        self.assertEqual(qt.tree_ids, ['0', '1', '2', '3'])
+        qt.split()
+        self.assertTrue(all(len(qid) == 2 for qid in qt.tree_ids))
+        self.assertEqual(qt.tree_ids, sorted(qt.tree_ids))
 
         qt = QuadTree(df, force_square=False)
         qt.split_recursive(max_samples=1)
         self.assertEqual(len(qt.to_frame().index), 6)
+        self.assertTrue(
+            np.allclose(qt.bounds, qt.to_frame().total_bounds),
+        )
+
+    def test_counts(self):
+        df = frame_from_coords(DATA3)
+        qt = QuadTree(df, force_square=True)
+        qt.split_recursive(max_samples=100)
+        counts = qt.counts
+        for qid, geom in zip(qt.tree_ids, qt.tree):
+            self.assertEqual(counts[qid], int(df.intersects(geom).sum()))
+            self.assertEqual(qt.count(qid), counts[qid])
+
+        counts_df = qt.counts_to_frame()
+        self.assertEqual(
+            dict(zip(counts_df[ID_COLUMN], counts_df.qcounts)), counts
+        )
+
+        # Polygon samples are counted with the same predicate
+        df = frame_from_coords(DATA3).to_crs('epsg:8858')
+        df.geometry = df.buffer(3_000)
+        qt = QuadTree(df, force_square=True)
+        qt.split_recursive(max_length=20_000)
+        counts = qt.counts
+        for qid, geom in zip(qt.tree_ids, qt.tree):
+            self.assertEqual(counts[qid], int(df.intersects(geom).sum()))
+            self.assertEqual(qt.count(qid), counts[qid])
+
+    def test_geometry_cache(self):
+        df = frame_from_coords(DATA1)
+        qt = QuadTree(df, force_square=False)
+        qt.split()
+        self.assertTrue(qt.to_geom() == qt.to_geom())
+        frame = qt.to_frame()
+        frame[ID_COLUMN] = 'x'
+        self.assertEqual(qt.to_frame()[ID_COLUMN].tolist(), qt.tree_ids)
+
+        # Splitting invalidates the cached geometry
+        qt.split()
+        self.assertEqual(len(qt.to_geom()), len(qt.tree_bounds))
+        self.assertEqual(qt.to_frame()[ID_COLUMN].tolist(), qt.tree_ids)
 
     def test_deterministic_sample(self):
         df = frame_from_coords(DATA1)
@@ -139,6 +282,9 @@ class TestTree(unittest.TestCase):
         self.assertTrue(query_df.iloc[0].geometry == Point(-88, 38))
         self.assertTrue(query_df.iloc[1].geometry == Point(-90, 40))
 
+        parallel_df = df.grts.query_points(search_points, k=1, workers=-1)
+        self.assertTrue(parallel_df.equals(query_df))
+
     def test_sample_train_val_test(self):
         df = frame_from_coords(DATA3)
         df = df.to_crs('epsg:8858')
@@ -151,9 +297,33 @@ class TestTree(unittest.TestCase):
             samples_per_grid=1,
             random_state=42,
         )
-        assert len(splits.train.grid_df.index) == 1
-        assert splits.train.grid_df.uid.iloc[0] == '31'
-        assert len(splits.val.grid_df.index) == 1
-        assert splits.val.grid_df.uid.iloc[0] == '03'
-        assert len(splits.test.grid_df.index) == 1
-        assert splits.test.grid_df.uid.iloc[0] == '01'
+        split_ids = []
+        for split in (splits.train, splits.val, splits.test):
+            assert len(split.grid_df.index) == 1
+            split_ids.append(split.grid_df.uid.iloc[0])
+            # Samples come from the split grid
+            assert split.point_df.intersects(
+                split.grid_df.geometry.iloc[0]
+            ).all()
+
+        # Splits do not share grids
+        assert len(set(split_ids)) == 3
+        assert not set(split_ids).difference(qt.tree_ids)
+
+    def test_split_kfold(self):
+        df = frame_from_coords(DATA3)
+        df = df.to_crs('epsg:8858')
+        qt = QuadTree(df, force_square=True)
+        qt.split_recursive(max_length=20_000)
+        test_ids = []
+        for splits in qt.split_kfold(n_splits=3, random_state=42):
+            self.assertEqual(len(splits.test.grid_df.index), len(qt) // 3)
+            self.assertEqual(
+                len(splits.train.grid_df.index)
+                + len(splits.test.grid_df.index),
+                len(qt),
+            )
+            test_ids.extend(splits.test.grid_df[ID_COLUMN].tolist())
+
+        # Test grids do not repeat across folds
+        self.assertEqual(len(test_ids), len(set(test_ids)))